@@ -5,27 +5,83 @@ and the Tor Browser.
 This module contains general functions and helpers.
 """
 
-import json
+# hashlib, json, shutil and yaml are imported lazily in the functions
+# using them to keep startup fast for invocations that don't need them
+# (like shell completions).
+import functools
 import os
-import shutil
 import subprocess  # nosec  # It's okay to start processes.
-import time
+import sys
 import uuid
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Set
 
 import click
-import yaml
 
 from . import error, model
 from .cli import cli
 
-
+# Locations of browser profile data relative to an instance directory.
+FIREFOX_PROFILES_PATH = os.path.join(".mozilla", "firefox")
+TOR_BROWSER_PROFILE_PATH = os.path.join(
+    ".local",
+    "share",
+    "tor-browser",
+    "TorBrowser",
+    "Data",
+    "Browser",
+    "profile.default",
+)
+
+# Browser executables by profile type.
+EXECUTABLES = {
+    model.ProfileType.FIREFOX: "firefox",
+    model.ProfileType.TOR_BROWSER: "tor-browser",
+}
+
+# Browser arguments for the run that initializes a new instance's
+# profile. Taking a screenshot makes the browser exit once it's done.
+INSTANCE_INIT_ARGS = [b"--screenshot", b"/dev/null", b"about:blank"]
+
+# Sandbox arguments that are the same for every browser run.
+BWRAP_STATIC_ARGS = [
+    b"--unshare-all",
+    b"--setenv",
+    b"HOME",
+    b"/home/user",
+    b"--setenv",
+    b"USER",
+    b"user",
+    b"--ro-bind",
+    b"/etc/fonts",
+    b"/etc/fonts",
+    b"--ro-bind",
+    b"/etc/ssl",
+    b"/etc/ssl",
+    b"--ro-bind",
+    b"/etc/static/ssl",
+    b"/etc/static/ssl",
+    b"--setenv",
+    b"XDG_SESSION_TYPE",
+    b"wayland",
+    b"--setenv",
+    b"MOZ_ENABLE_WAYLAND",
+    b"1",
+    b"--dev",
+    b"/dev",
+    b"--proc",
+    b"/proc",
+]
+
+
+@functools.lru_cache(maxsize=None)
 def enum_synopsis(enum) -> str:
     """
     enum_synopsis returns a human-readably overview of an enum's
     values.
+
+    Enums are constant, so the result is computed once per enum.
     """
     return "|".join([v.value for v in enum])
 
@@ -33,21 +89,9 @@ def enum_synopsis(enum) -> str:
 def load_config() -> model.Configuration:
     """load_config loads the global multifox configuration."""
     config_file = os.path.join(get_config_dir(), "config.yml")
-    with open(config_file, "r", encoding="utf-8") as f:
-        return model.configuration_from_yaml(yaml.safe_load(f))
-
-
-def find_profile_by_name(
-    profiles: List[model.Profile], name: str
-) -> Optional[model.Profile]:
-    """
-    find_profile_by_name returns the profile from the given list of
-    profiles whose name matches the given name.
-    """
-    for profile in profiles:
-        if profile.name == name:
-            return profile
-    return None
+    with open(config_file, "rb") as f:
+        config_yaml = f.read()
+    return model.configuration_from_yaml(parse_yaml(config_yaml))
 
 
 def find_best_instance_for_start(profile: model.Profile) -> model.Instance:
@@ -69,30 +113,28 @@ def find_best_instance_for_start(profile: model.Profile) -> model.Instance:
 
     instance_base_dir = get_instance_base_dir(profile.id)
     os.makedirs(instance_base_dir, mode=0o755, exist_ok=True)
-    instance_dirs = os.listdir(instance_base_dir)
+    with os.scandir(instance_base_dir) as entries:
+        instance_dirs = [entry.path for entry in entries if entry.is_dir()]
     if profile.instantiation == model.ProfileInstantiation.SINGLE:
         n_instances = len(instance_dirs)
         if n_instances == 1:
-            return load_instance(os.path.join(instance_base_dir, instance_dirs[0]))
+            return load_instance(instance_dirs[0])
         if n_instances == 0:
             return create_instance(profile)
         raise error.BrokenProfileException(
             f'Profile "{profile.name}" is set to single instantiation mode but number of existing instances is {n_instances}'  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
         )
     if profile.instantiation == model.ProfileInstantiation.MULTIPLE:
-        oldest_free_instance = None
-        for instance_dir in instance_dirs:
-            instance = load_instance(os.path.join(instance_base_dir, instance_dir))
-            if instance_in_use(instance):
-                continue
-            if (
-                oldest_free_instance is None
-                or instance.creation_time < oldest_free_instance.creation_time
-            ):
-                oldest_free_instance = instance
-        if oldest_free_instance is None:
-            return create_instance(profile)
-        return oldest_free_instance
+        # Go from oldest to newest so the first free instance is the
+        # one to use and the remaining ones don't need to be checked.
+        instances = sorted(
+            (load_instance(instance_dir) for instance_dir in instance_dirs),
+            key=lambda instance: instance.creation_time,
+        )
+        for instance in instances:
+            if not instance_in_use(instance):
+                return instance
+        return create_instance(profile)
     raise error.BrokenProfileException(
         f'"instantiation" must be one of {enum_synopsis(model.ProfileInstantiation)} but is "{profile.instantiation.value}"'  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
     )
@@ -102,20 +144,19 @@ def create_instance(profile: model.Profile) -> model.Instance:
     """
     create_instance initializes a new instance for the given profile.
     """
-    instance = model.Instance()
-    instance.id = uuid.uuid4().__str__()
-    instance.profile_id = profile.id
-    instance.creation_time = datetime.now()
+    instance = model.Instance(
+        creation_time=datetime.now(),
+        id=uuid.uuid4().hex,
+        installed_extensions=[],
+        profile_id=profile.id,
+        usage_pid=None,
+    )
     write_instance(instance)
-    instance_dir = os.path.join(get_instance_base_dir(profile.id), instance.id)
+    instance_dir = get_instance_dir(instance)
     # There are no untrusted user inputs in this subprocess call.
     subprocess.run(  # nosec
         get_bubblewrap_cmd_line(profile.configuration.type, instance_dir)
-        + [
-            b"--screenshot",
-            b"/dev/null",
-            b"about:blank",
-        ],
+        + INSTANCE_INIT_ARGS,
         check=True,
         env=os.environ,
     )
@@ -139,10 +180,7 @@ def update_userjs(config: model.ProfileConfiguration, instance: model.Instance):
     specified in the profile configuration.
     """
     userjs_in_instance = os.path.join(
-        find_browser_profile_dir(
-            config.type,
-            os.path.join(get_instance_base_dir(instance.profile_id), instance.id),
-        ),
+        find_browser_profile_dir(config.type, get_instance_dir(instance)),
         "user.js",
     )
     if config.userjs is None:
@@ -150,10 +188,10 @@ def update_userjs(config: model.ProfileConfiguration, instance: model.Instance):
             os.remove(userjs_in_instance)
     else:
         src_userjs = os.path.join(get_config_dir(), config.userjs)
-        shutil.copyfile(src_userjs, userjs_in_instance)
+        copy_file(src_userjs, userjs_in_instance)
 
     # Set preference to enable unattended extension installation from extensions folder.
-    if config.extensions is not None and len(config.extensions) > 0:
+    if len(config.extensions) > 0:
         with open(userjs_in_instance, "a", encoding="utf-8") as f:
             f.write('user_pref("extensions.autoDisableScopes", 14);\n')
 
@@ -163,28 +201,20 @@ def install_extensions(config: model.ProfileConfiguration, instance: model.Insta
     install_extensions installs and removes extensions in the profile
     to match the given configuration.
     """
+    import json  # pylint: disable=import-outside-toplevel
+
     config_path = get_config_dir()
-    instance_dir = os.path.join(
-        get_instance_base_dir(instance.profile_id),
-        instance.id,
-    )
+    instance_dir = get_instance_dir(instance)
     browser_profile_dir = find_browser_profile_dir(config.type, instance_dir)
     extensions_base_path = os.path.join(browser_profile_dir, "extensions")
 
-    # Remove all installed extensions by default.
-    to_remove = set(instance.installed_extensions)
-    to_install = set()
-
-    # Go over wanted extensions, keep the ones we already have and install the missing ones.
-    if config.extensions is not None:
-        for extension_file_path in config.extensions:
-            extension_file_name = os.path.basename(extension_file_path)
-            if extension_file_name in to_remove:
-                # The extension is already installed and does not need to be removed.
-                to_remove.remove(extension_file_name)
-            else:
-                # The extension is not already installed and needs to be installed.
-                to_install.add(extension_file_path)
+    # Map wanted extension file names to their paths. Extensions that
+    # are installed but not wanted are removed, wanted ones that are
+    # not installed yet are installed.
+    wanted = {os.path.basename(p): p for p in config.extensions}
+    installed = set(instance.installed_extensions)
+    to_remove = installed - wanted.keys()
+    to_install = wanted.keys() - installed
 
     # Read extension-preferences.json
     extension_preferences = None
@@ -194,6 +224,29 @@ def install_extensions(config: model.ProfileConfiguration, instance: model.Insta
     with open(extension_preferences_path, "r", encoding="utf-8") as ext_pref_file:
         extension_preferences = json.load(ext_pref_file)
 
+    # Instances set up by older versions may have preference entries
+    # under legacy extension IDs. Legacy IDs that are the real ID of a
+    # wanted extension belong to that extension and are left alone.
+    wanted_ids = {extension_id_from_file_path(name) for name in wanted}
+
+    def stale_legacy_id(extension_file_name: str) -> Optional[str]:
+        legacy_id = legacy_extension_id_from_file_path(extension_file_name)
+        if legacy_id == extension_id_from_file_path(extension_file_name):
+            return None
+        if legacy_id in wanted_ids:
+            return None
+        return legacy_id
+
+    # Move entries of wanted extensions from their legacy ID to their
+    # actual ID.
+    for extension_file_name in wanted:
+        legacy_id = stale_legacy_id(extension_file_name)
+        if legacy_id is not None and legacy_id in extension_preferences:
+            extension_preferences.setdefault(
+                extension_id_from_file_path(extension_file_name),
+                extension_preferences.pop(legacy_id),
+            )
+
     # Actually apply the remove list.
     for extension_file_name in to_remove:
         extension_id = extension_id_from_file_path(extension_file_name)
@@ -205,21 +258,23 @@ def install_extensions(config: model.ProfileConfiguration, instance: model.Insta
         ):  # Handle broken instances that can still be saved by ignoring already missing files.
             os.remove(extension_in_instance)
 
-        # Delete from extension-prefereces file.
-        del extension_preferences[extension_id]
+        # Delete from extension-prefereces file, including any entry
+        # under the legacy ID. Missing entries are ignored like
+        # missing files above.
+        extension_preferences.pop(extension_id, None)
+        legacy_id = stale_legacy_id(extension_file_name)
+        if legacy_id is not None:
+            extension_preferences.pop(legacy_id, None)
 
     # Actually apply the install list.
-    for rel_extension_file_path in to_install:
-        extension_file_path = os.path.join(config_path, rel_extension_file_path)
-        extension_file_name = os.path.basename(extension_file_path)
+    for extension_file_name in to_install:
+        extension_file_path = os.path.join(config_path, wanted[extension_file_name])
         extension_id = extension_id_from_file_path(extension_file_name)
 
         # Copy to extensions dir.
         extension_in_instance = os.path.join(extensions_base_path, extension_file_name)
         os.makedirs(extensions_base_path, mode=0o755, exist_ok=True)
-        shutil.copyfile(
-            extension_file_path, extension_in_instance, follow_symlinks=True
-        )
+        copy_file(extension_file_path, extension_in_instance)
 
         # Add to extension-preferences file.
         extension_preferences[extension_id] = {
@@ -228,15 +283,13 @@ def install_extensions(config: model.ProfileConfiguration, instance: model.Insta
         }
 
     # Write out extension-preferences.json.
-    with open(extension_preferences_path, "w", encoding="utf-8") as ext_pref_file:
-        json.dump(extension_preferences, ext_pref_file)
+    write_file_atomically(
+        extension_preferences_path,
+        json.dumps(extension_preferences).encode("utf-8"),
+    )
 
     # Update instance info.
-    instance.installed_extensions = (
-        [os.path.basename(p) for p in config.extensions]
-        if config.extensions is not None
-        else []
-    )
+    instance.installed_extensions = list(wanted)
     write_instance(instance)
 
     # Start the browser once to finish installation or removal of addons.
@@ -251,6 +304,7 @@ def install_extensions(config: model.ProfileConfiguration, instance: model.Insta
             [
                 "zenity",
                 "--progress",
+                "--pulsate",
                 "--no-cancel",
                 "--title",
                 "Installing extensions",
@@ -277,27 +331,26 @@ def install_extensions(config: model.ProfileConfiguration, instance: model.Insta
             + [b"--headless"],
         )
 
-        # HACK: Wait for ten seconds so that the browser can finish
+        # HACK: Give the browser up to ten seconds to finish
         # initializing our new extensions.
         #
         # I'm not sure what the browser is actually doing here but
         # shorter timeouts (tried with five seconds) don't work.
+        # Usually the headless browser doesn't exit on its own, so
+        # stop it once the time is up.
         #
         # It would be nice to have a more stable installation method,
         # maybe via Selenium? (Apparently Selenium can install
         # extensions.)
-        for i in range(1, 101):
-            time.sleep(0.1)
-            # Update the zenity progress bar.
-            zenity_stdin = zenity.stdin
-            if zenity_stdin is not None:
-                zenity_stdin.write(f"{i}\n".encode("utf-8"))
-                zenity_stdin.flush()
-
-        # Stop and wait for the browser and zenity.
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.terminate()
+            proc.wait()
+
+        # Stop and wait for zenity.
         zenity.terminate()
-        proc.terminate()
-        proc.wait()
+        zenity.wait()
 
 
 def extension_id_from_file_path(extension_file_path: str) -> str:
@@ -307,9 +360,56 @@ def extension_id_from_file_path(extension_file_path: str) -> str:
 
     The extension file must be named "<extension-id>.xpi".
     """
+    return os.path.basename(extension_file_path).removesuffix(".xpi")
+
+
+def legacy_extension_id_from_file_path(extension_file_path: str) -> str:
+    """
+    legacy_extension_id_from_file_path returns the ID that older
+    versions of multifox derived for the extension at the given file
+    path.
+
+    Those versions stripped any trailing ".", "x", "p" and "i"
+    characters instead of just the ".xpi" suffix, so for example
+    "sponsorblock@ajay.app.xpi" became "sponsorblock@ajay.a".
+    """
     return os.path.basename(extension_file_path).rstrip(".xpi")
 
 
+def copy_file(src: str, dst: str):
+    """
+    copy_file copies the contents of the file at src to dst.
+
+    On Linux this uses copy_file_range(2), which lets filesystems that
+    support it reflink the data instead of copying it. Everything else
+    goes through shutil.copyfile.
+
+    Like shutil.copyfile, shutil.SameFileError is raised if src and dst
+    are the same file.
+    """
+    import shutil  # pylint: disable=import-outside-toplevel
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            same_file = os.path.samefile(src, dst)
+        except FileNotFoundError:
+            same_file = False
+        if same_file:
+            # Opening dst for writing would truncate src.
+            raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                while os.copy_file_range(src_file.fileno(), dst_file.fileno(), 1 << 30):
+                    pass
+            return
+        except OSError:
+            # copy_file_range can't handle every pair of files (for
+            # example across filesystems on older kernels). Actual
+            # errors will be raised again by shutil.
+            pass
+    shutil.copyfile(src, dst)
+
+
 def launch_browser(
     profile_type: model.ProfileType, instance: model.Instance, args: List[bytes]
 ):
@@ -317,7 +417,7 @@ def launch_browser(
     launch_browser launches the browser program for the given profile
     instance.
     """
-    instance_dir = os.path.join(get_instance_base_dir(instance.profile_id), instance.id)
+    instance_dir = get_instance_dir(instance)
     # args can be used to pass arbitrary arguments to the browser but it is assumed to be trusted.
     subprocess.run(  # nosec
         get_bubblewrap_cmd_line(profile_type, instance_dir) + list(args),
@@ -326,33 +426,36 @@ def launch_browser(
     )
 
 
+@functools.lru_cache(maxsize=None)
 def find_browser_profile_dir(profile_type: model.ProfileType, instance_dir: str) -> str:
     """
     find_browser_profile_dir returns a path to the actual browser
     profile for the given instance.
 
     profile_type must be set to the instance's profile type.
+
+    The browser profile of an instance never moves once it has been
+    created, so results are cached.
     """
     if profile_type == model.ProfileType.FIREFOX:
-        firefox_dir = os.path.join(instance_dir, ".mozilla", "firefox")
-        profile_dirs = [p for p in os.listdir(firefox_dir) if p.endswith(".default")]
-        if len(profile_dirs) != 1:
+        firefox_dir = os.path.join(instance_dir, FIREFOX_PROFILES_PATH)
+        profile_dir = None
+        with os.scandir(firefox_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".default"):
+                    continue
+                if profile_dir is not None:
+                    # Stop at the second match, it's already an error.
+                    profile_dir = None
+                    break
+                profile_dir = entry.path
+        if profile_dir is None:
             raise error.BrokenInstanceException(
                 "Firefox profiles in instance directory != 1 but an instance should only ever contain one browser profile"  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
             )
-        profile_dir = os.path.join(firefox_dir, profile_dirs[0])
         return profile_dir
     if profile_type == model.ProfileType.TOR_BROWSER:
-        profile_dir = os.path.join(
-            instance_dir,
-            ".local",
-            "share",
-            "tor-browser",
-            "TorBrowser",
-            "Data",
-            "Browser",
-            "profile.default",
-        )
+        profile_dir = os.path.join(instance_dir, TOR_BROWSER_PROFILE_PATH)
         if not os.path.isdir(profile_dir):
             raise error.BrokenInstanceException(
                 f'Instance does not contain a profile (no directory at "{profile_dir}")'
@@ -373,115 +476,152 @@ def get_bubblewrap_cmd_line(
 
     Additional arguments can be appended at the end.
     """
-    executable = os.path.realpath(
-        # There is no untrusted input in this subprocess invocation.
-        subprocess.check_output(  # nosec
-            ["which", get_executable(profile_type)]
-        ).rstrip(b"\n")
-    )
+    import shutil  # pylint: disable=import-outside-toplevel
+
+    executable_name = get_executable(profile_type)
+    executable_path = shutil.which(executable_name)
+    if executable_path is None:
+        raise click.ClickException(f'Executable "{executable_name}" not found in PATH')
+    executable = os.fsencode(os.path.realpath(executable_path))
 
     extra_store_paths = set()
     for path in ["/etc/fonts", "/etc/ssl", "/etc/static/ssl"]:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for dirname in dirnames + filenames:
-                realpath = os.path.realpath(os.path.join(dirpath, dirname))
-                if realpath.startswith("/nix/store/"):
-                    extra_store_paths.add(realpath.encode("utf-8"))
+        extra_store_paths |= find_nix_store_paths(path)
 
-    store_paths = (
-        # It is assumed that the location of the browser executable
-        # does not constitute harmful input for this subprocess call.
-        subprocess.check_output(  # nosec
-            [b"nix-store", b"--query", b"--requisites", executable]
-            + list(extra_store_paths)
-        )
-        .rstrip(b"\n")
-        .splitlines()
-    )
-
-    cmd_line = [b"bwrap"]
-    for store_path in store_paths:
-        cmd_line.append(b"--ro-bind")
-        cmd_line.append(store_path)
-        cmd_line.append(store_path)
+    store_paths = query_nix_store_requisites([executable] + list(extra_store_paths))
 
     # NOTE: We can't bind D-Bus since Firefox "merges" profiles with
     # D-Bus enabled.
 
     xdg_runtime_dir = os.environ["XDG_RUNTIME_DIR"]
 
-    pulseaudio_socket_path = f"{xdg_runtime_dir}/pulse"
-
-    wayland_display = os.environ["WAYLAND_DISPLAY"]
-    wayland_socket_path = f"{xdg_runtime_dir}/{wayland_display}"
-
-    for arg in [
-        "--unshare-all",
-        "--setenv",
-        "HOME",
-        "/home/user",
-        "--setenv",
-        "USER",
-        "user",
-        "--ro-bind",
-        "/etc/fonts",
-        "/etc/fonts",
-        "--ro-bind",
-        "/etc/ssl",
-        "/etc/ssl",
-        "--ro-bind",
-        "/etc/static/ssl",
-        "/etc/static/ssl",
-        "--bind",
-        instance_dir,
-        "/home/user",
-        "--setenv",
-        "XDG_SESSION_TYPE",
-        "wayland",
-        "--setenv",
-        "MOZ_ENABLE_WAYLAND",
-        "1",
-        "--setenv",
-        "WAYLAND_DISPLAY",
-        wayland_display,
-        "--bind",
-        wayland_socket_path,
-        wayland_socket_path,
-        "--bind",
-        pulseaudio_socket_path,
-        pulseaudio_socket_path,
-        "--dev",
-        "/dev",
-        "--proc",
-        "/proc",
-    ]:
-        cmd_line.append(arg.encode(encoding="utf-8"))
+    pulseaudio_socket_path = os.fsencode(f"{xdg_runtime_dir}/pulse")
+
+    wayland_display = os.fsencode(os.environ["WAYLAND_DISPLAY"])
+    wayland_socket_path = os.fsencode(xdg_runtime_dir) + b"/" + wayland_display
 
+    cmd_line = [b"bwrap"]
+    for store_path in store_paths:
+        cmd_line.extend((b"--ro-bind", store_path, store_path))
+    cmd_line.extend(BWRAP_STATIC_ARGS)
+    cmd_line.extend(
+        (
+            b"--bind",
+            os.fsencode(instance_dir),
+            b"/home/user",
+            b"--setenv",
+            b"WAYLAND_DISPLAY",
+            wayland_display,
+            b"--bind",
+            wayland_socket_path,
+            wayland_socket_path,
+            b"--bind",
+            pulseaudio_socket_path,
+            pulseaudio_socket_path,
+        )
+    )
     if allow_net:
         cmd_line.append(b"--share-net")
-
     if extra_bwrap_args is not None:
-        for extra_arg in extra_bwrap_args:
-            cmd_line.append(extra_arg)
-
-    cmd_line.append(b"--")
-    cmd_line.append(executable)
+        cmd_line.extend(extra_bwrap_args)
+    cmd_line.extend((b"--", executable))
 
     return cmd_line
 
 
+def find_nix_store_paths(path: str) -> Set[bytes]:
+    """
+    find_nix_store_paths returns the Nix store paths that the file tree
+    at the given path resolves into.
+
+    If the path itself resolves into the store, that store path is
+    returned as-is since its closure covers everything below it.
+    Otherwise only symlinks in the tree need to be resolved: a regular
+    file or directory below a path that isn't in the store can't be in
+    the store either. Symlinked directories are not descended into.
+    """
+    realpath = os.path.realpath(path)
+    store_path = nix_store_path_of(realpath)
+    if store_path is not None:
+        return {os.fsencode(store_path)}
+
+    store_paths = set()
+    dirs = [realpath]
+    while dirs:
+        try:
+            with os.scandir(dirs.pop()) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        store_path = nix_store_path_of(os.path.realpath(entry.path))
+                        if store_path is not None:
+                            store_paths.add(os.fsencode(store_path))
+                    elif entry.is_dir():
+                        dirs.append(entry.path)
+        except OSError:
+            # Skip missing and unreadable directories like os.walk does.
+            continue
+    return store_paths
+
+
+def nix_store_path_of(path: str) -> Optional[str]:
+    """
+    nix_store_path_of returns the top-level Nix store path
+    ("/nix/store/<hash>-<name>") containing the given absolute path or
+    `None` if the path is not in the store.
+
+    Many files in /etc resolve into the same store path, so this keeps
+    the number of paths to query small.
+    """
+    if not path.startswith("/nix/store/"):
+        return None
+    return "/".join(path.split("/", 4)[:4])
+
+
+def query_nix_store_requisites(paths: List[bytes]) -> List[bytes]:
+    """
+    query_nix_store_requisites returns the closure of the given Nix
+    store paths.
+
+    Store paths are immutable and so is their closure, so results are
+    cached in the cache directory by the set of paths queried and never
+    need to be invalidated.
+    """
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    paths = sorted(set(paths))
+    cache_key = hashlib.sha256(b"\0".join(paths)).hexdigest()
+    cache_file = os.path.join(get_cache_dir(), "store-requisites", cache_key)
+    try:
+        with open(cache_file, "rb") as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        pass
+
+    requisites = (
+        # It is assumed that the location of the browser executable
+        # does not constitute harmful input for this subprocess call.
+        subprocess.check_output(  # nosec
+            [b"nix-store", b"--query", b"--requisites"] + paths
+        )
+        .rstrip(b"\n")
+        .splitlines()
+    )
+    os.makedirs(os.path.dirname(cache_file), mode=0o755, exist_ok=True)
+    write_file_atomically(cache_file, b"\n".join(requisites))
+    return requisites
+
+
 def get_executable(profile_type: model.ProfileType) -> str:
     """
     get_executable returns the browser executable to use for the
     profile.
     """
-    if profile_type == model.ProfileType.FIREFOX:
-        return "firefox"
-    if profile_type == model.ProfileType.TOR_BROWSER:
-        return "tor-browser"
-    raise ValueError(
-        f'Unknown profile type "{profile_type.value}". Must be one of {enum_synopsis(model.ProfileType)}.'  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
-    )
+    try:
+        return EXECUTABLES[profile_type]
+    except KeyError as ex:
+        raise ValueError(
+            f'Unknown profile type "{profile_type.value}". Must be one of {enum_synopsis(model.ProfileType)}.'  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
+        ) from ex
 
 
 def instance_in_use(instance: model.Instance) -> bool:
@@ -500,22 +640,22 @@ def load_instance(instance_dir: str) -> model.Instance:
     directory.
     """
     instance_info_file = os.path.join(instance_dir, "instance.yml")
-    with open(instance_info_file, "r", encoding="utf-8") as f:
-        instance_yaml = yaml.safe_load(f)
-        return model.instance_from_yaml(instance_yaml)
+    with open(instance_info_file, "rb") as f:
+        instance_yaml = f.read()
+    return model.instance_from_yaml(parse_yaml(instance_yaml))
 
 
 def write_instance(instance: model.Instance):
     """
     write_instance writes the given instance information to disk.
     """
-    instance_dir = os.path.join(get_instance_base_dir(instance.profile_id), instance.id)
+    instance_dir = get_instance_dir(instance)
     instance_info_file = os.path.join(instance_dir, "instance.yml")
     os.makedirs(instance_dir, mode=0o755, exist_ok=True)
-    with open(instance_info_file, "w", encoding="utf-8") as f:
-        yaml.dump(instance.to_yaml(), f, Dumper=yaml.CDumper)
+    write_file_atomically(instance_info_file, dump_yaml(instance.to_yaml()))
 
 
+@functools.lru_cache(maxsize=None)
 def get_instance_base_dir(profile_id: str) -> str:
     """
     get_instance_base_dir returns the directory for all instances of
@@ -524,6 +664,47 @@ def get_instance_base_dir(profile_id: str) -> str:
     return os.path.join(get_state_dir(), "instances", profile_id)
 
 
+def parse_yaml(data: bytes):
+    """
+    parse_yaml parses the given YAML document using a safe loader.
+
+    libyaml's C parser is used unless PyYAML was built without it.
+    """
+    # pylint: disable=import-outside-toplevel
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader  # type: ignore
+
+    return yaml.load(data, Loader=SafeLoader)
+
+
+def dump_yaml(data) -> bytes:
+    """
+    dump_yaml serializes the given data to UTF-8 encoded YAML using a
+    safe dumper.
+
+    libyaml's C emitter is used unless PyYAML was built without it.
+    """
+    # pylint: disable=import-outside-toplevel
+    import yaml
+
+    try:
+        from yaml import CSafeDumper as SafeDumper
+    except ImportError:
+        from yaml import SafeDumper  # type: ignore
+
+    return yaml.dump(data, Dumper=SafeDumper, encoding="utf-8")
+
+
+def get_instance_dir(instance: model.Instance) -> str:
+    """get_instance_dir returns the directory of the given instance."""
+    return os.path.join(get_instance_base_dir(instance.profile_id), instance.id)
+
+
+@functools.lru_cache(maxsize=None)
 def get_config_dir() -> str:
     """get_config_dir returns the global configuration directory."""
     config_dir = (
@@ -535,6 +716,7 @@ def get_config_dir() -> str:
     return config_dir
 
 
+@functools.lru_cache(maxsize=None)
 def get_state_dir() -> str:
     """
     get_state_dir returns the global state directory.
@@ -552,12 +734,58 @@ def get_state_dir() -> str:
     return state_dir
 
 
-# Taken from https://stackoverflow.com/a/568285
+@functools.lru_cache(maxsize=None)
+def get_cache_dir() -> str:
+    """
+    get_cache_dir returns the global cache directory.
+
+    Everything in here can be deleted at any time and will be derived
+    again when needed.
+    """
+    cache_dir = (
+        os.environ["XDG_CACHE_HOME"]
+        if "XDG_CACHE_HOME" in os.environ
+        else os.path.join(os.environ["HOME"], ".cache")
+    )
+    cache_dir = os.path.join(cache_dir, "multifox")
+    return cache_dir
+
+
+def write_file_atomically(path: str, data: bytes):
+    """
+    write_file_atomically replaces the file at the given path with the
+    given data.
+
+    The data is written to a temporary file next to the target which is
+    then renamed over it, so readers never see a partially written
+    file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def check_pid(pid: int) -> bool:
-    """check_pid checks if a process with the given PID exists."""
+    """
+    check_pid checks if a process with the given PID exists.
+
+    On Linux this is a lookup in /proc, which unlike signalling the
+    process also works for processes owned by other users.
+    """
+    if sys.platform == "linux":
+        return os.path.isdir(f"/proc/{pid}")
+    # Taken from https://stackoverflow.com/a/568285
     try:
         os.kill(pid, 0)
-    except OSError:
+    except ProcessLookupError:
         return False
-    else:
+    except PermissionError:
+        # The process exists but belongs to another user.
         return True
+    return True
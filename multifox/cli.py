@@ -14,9 +14,12 @@ from multifox import gui
 # so set it explicitly here.
 sys.argv[0] = "multifox"
 
+# Every command gets the same help option, including the short form.
+help_option = click.help_option("--help", "-h", help="Show this message and exit")
+
 
 @click.group(add_help_option=False, invoke_without_command=True)
-@click.help_option("--help", "-h", help="Show this message and exit")
+@help_option
 @click.pass_context
 def cli(ctx: click.Context):
     """
@@ -28,7 +31,7 @@ def cli(ctx: click.Context):
 
 
 @cli.command(add_help_option=False)
-@click.help_option("--help", "-h", help="Show this message and exit")
+@help_option
 @click.option("--profile", "-p", nargs=1, help="Use the given profile")
 @click.argument("args", nargs=-1)
 def launch(profile, args):
@@ -41,7 +44,7 @@ def launch(profile, args):
         if profile_name is None:
             raise click.UsageError("No profile selected")
 
-    profile = multifox.find_profile_by_name(config.profiles, profile_name)
+    profile = config.profiles_by_name.get(profile_name)
     if profile is None:
         raise click.UsageError(f'Profile "{profile_name}" does not exist')
 
@@ -4,23 +4,27 @@
 import click
 
 
-class BrokenProfileException(click.ClickException):
-    """BrokenProfileException marks a broken profile."""
+class PrefixedException(click.ClickException):
+    """
+    PrefixedException is the base for errors whose message is prefixed
+    with a description of what is broken.
+
+    Subclasses set the prefix via the `prefix` class attribute.
+    """
+
+    prefix = ""
 
     def __init__(self, message):
-        super().__init__(message)
-        self.message = f"Broken profile: {message}"
+        super().__init__(f"{self.prefix}: {message}")
+
 
-    def __str__(self):
-        return self.message
+class BrokenProfileException(PrefixedException):
+    """BrokenProfileException marks a broken profile."""
 
+    prefix = "Broken profile"
 
-class BrokenInstanceException(click.ClickException):
-    """BrokenInstanceException marks a broken profile instance."""
 
-    def __init__(self, message):
-        super().__init__(message)
-        self.message = f"Broken instance: {message}"
+class BrokenInstanceException(PrefixedException):
+    """BrokenInstanceException marks a broken profile instance."""
 
-    def __str__(self):
-        return self.message
+    prefix = "Broken instance"
@@ -4,6 +4,7 @@ interfaces of multifox.
 """
 
 
+import functools
 from typing import List, Optional
 
 import gi
@@ -11,6 +12,7 @@ import gi
 from . import model
 
 
+@functools.lru_cache(maxsize=None)
 def init_gtk_modules():
     """
     init_gtk_modules initializes GDK and GTK which is required for
@@ -23,6 +25,8 @@ def init_gtk_modules():
 
     Mypy can't handle modules returned from functions so the import
     has to be done separately.
+
+    The initialization only needs to happen once per process.
     """
     gi.require_version("Gdk", "3.0")
     gi.require_version("Gtk", "3.0")
@@ -1,11 +1,17 @@
 """
 model contains Python classes and associated functions for handling
 program data in a structured way.
+
+The data classes declare their __slots__ by hand because
+dataclass(slots=True) requires Python 3.10.
 """
 
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+from . import error
 
 
 class ProfileType(Enum):
@@ -15,13 +21,19 @@ class ProfileType(Enum):
     TOR_BROWSER = "tor-browser"
 
 
+PROFILE_TYPES_BY_VALUE = {t.value: t for t in ProfileType}
+
+
+@dataclass
 class ProfileConfiguration:
     """
     ProfileConfiguration describes settings and customizations of a
     browser profile.
     """
 
-    extensions: Optional[List[str]]
+    __slots__ = ("extensions", "type", "userjs")
+
+    extensions: List[str]
     type: ProfileType
     userjs: Optional[str]
 
@@ -33,17 +45,18 @@ def profile_configuration_from_yaml(
     profile_configuration_from_yaml creates a ProfileConfiguration
     object from a parsed YAML file.
     """
-    profile_config = ProfileConfiguration()
-    profile_config.extensions = (
-        profile_config_yaml["extensions"]
-        if "extensions" in profile_config_yaml
-        else None
+    type_value = profile_config_yaml["type"]
+    try:
+        profile_type = PROFILE_TYPES_BY_VALUE[type_value]
+    except KeyError as ex:
+        raise error.BrokenProfileException(
+            f'"type" must be one of {"|".join(PROFILE_TYPES_BY_VALUE)} but is "{type_value}"'  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
+        ) from ex
+    return ProfileConfiguration(
+        extensions=profile_config_yaml.get("extensions") or [],
+        type=profile_type,
+        userjs=profile_config_yaml.get("userjs"),
     )
-    profile_config.type = ProfileType(profile_config_yaml["type"])
-    profile_config.userjs = (
-        profile_config_yaml["userjs"] if "userjs" in profile_config_yaml else None
-    )
-    return profile_config
 
 
 class ProfileInstantiation(Enum):
@@ -56,9 +69,15 @@ class ProfileInstantiation(Enum):
     MULTIPLE = "multiple"
 
 
+PROFILE_INSTANTIATIONS_BY_VALUE = {i.value: i for i in ProfileInstantiation}
+
+
+@dataclass
 class Profile:
     """Profile describes a multifox profile."""
 
+    __slots__ = ("configuration", "id", "instantiation", "name")
+
     configuration: ProfileConfiguration
     id: str
     instantiation: ProfileInstantiation
@@ -72,21 +91,42 @@ def profile_from_yaml(
     profile_from_yaml creates a Profile object from a parsed YAML
     file.
     """
-    profile = Profile()
-    profile.configuration = profile_configuration_from_yaml(
-        profile_yaml["configuration"]
+    instantiation_value = profile_yaml["instantiation"]
+    try:
+        instantiation = PROFILE_INSTANTIATIONS_BY_VALUE[instantiation_value]
+    except KeyError as ex:
+        raise error.BrokenProfileException(
+            f'"instantiation" must be one of {"|".join(PROFILE_INSTANTIATIONS_BY_VALUE)} but is "{instantiation_value}"'  # pylint: disable=line-too-long  # This is a string, what do you expect me to do?
+        ) from ex
+    return Profile(
+        configuration=profile_configuration_from_yaml(profile_yaml["configuration"]),
+        id=profile_yaml["id"],
+        instantiation=instantiation,
+        name=profile_yaml["name"],
     )
-    profile.id = profile_yaml["id"]
-    profile.instantiation = ProfileInstantiation(profile_yaml["instantiation"])
-    profile.name = profile_yaml["name"]
-    return profile
 
 
+@dataclass
 class Configuration:
-    """Configuration holds the global multifox configuration."""
+    """
+    Configuration holds the global multifox configuration.
+
+    profiles_by_name is derived from profiles. If several profiles
+    share a name, the first one wins. It is a plain slot rather than a
+    dataclass field, so it is not passed to the constructor and not
+    part of comparisons or the repr. A field with init=False would
+    need a class-level default, which conflicts with __slots__.
+    """
+
+    __slots__ = ("profiles", "profiles_by_name")
 
     profiles: List[Profile]
 
+    def __post_init__(self) -> None:
+        self.profiles_by_name: Dict[str, Profile] = {}
+        for profile in self.profiles:
+            self.profiles_by_name.setdefault(profile.name, profile)
+
 
 def configuration_from_yaml(
     config_yaml,
@@ -95,19 +135,28 @@ def configuration_from_yaml(
     configuration_from_yaml creates a Configuration object from a
     parsed YAML file.
     """
-    config = Configuration()
-    config.profiles = [profile_from_yaml(p) for p in config_yaml["profiles"]]
-    return config
+    return Configuration(
+        profiles=list(map(profile_from_yaml, config_yaml["profiles"])),
+    )
 
 
+@dataclass
 class Instance:
     """Instance holds information about a profile instance."""
 
-    creation_time: datetime = datetime.now()
-    id: str = ""
-    installed_extensions: List[str] = list()
-    profile_id: str = ""
-    usage_pid: Optional[int] = None
+    __slots__ = (
+        "creation_time",
+        "id",
+        "installed_extensions",
+        "profile_id",
+        "usage_pid",
+    )
+
+    creation_time: datetime
+    id: str
+    installed_extensions: List[str]
+    profile_id: str
+    usage_pid: Optional[int]
 
     def to_yaml(self):
         """
@@ -131,12 +180,10 @@ def instance_from_yaml(
     instance_from_yaml creates an Instance object from a parsed YAML
     file.
     """
-    instance = Instance()
-    instance.creation_time = instance_yaml["creation_time"]
-    instance.id = instance_yaml["id"]
-    instance.installed_extensions = instance_yaml["installed_extensions"]
-    instance.profile_id = instance_yaml["profile_id"]
-    instance.usage_pid = (
-        instance_yaml["usage_pid"] if "usage_pid" in instance_yaml else None
+    return Instance(
+        creation_time=instance_yaml["creation_time"],
+        id=instance_yaml["id"],
+        installed_extensions=instance_yaml["installed_extensions"],
+        profile_id=instance_yaml["profile_id"],
+        usage_pid=instance_yaml.get("usage_pid"),
     )
-    return instance